@@ -2,180 +2,343 @@
 Endpoints da API para preços e arbitragem
 """
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Response, WebSocket, WebSocketDisconnect
+from typing import Dict, Hashable, List, Optional, Union
 from datetime import datetime
-import json
+import zlib
+import weakref
 import asyncio
 import logging
+from pydantic import BaseModel, TypeAdapter
 
-from app.models.price import Price, ArbitrageOpportunity, PriceComparison
+from app.models.price import (
+    Price, ArbitrageOpportunity, PriceComparison, SymbolPrices, PriceUpdate, ArbitrageUpdate, utc_now
+)
+from app.services.exchanges import exchange_manager
 from app.services.price_monitor import price_monitor
+from app.config import settings
+from app.utils.cache import AsyncTTLCache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["prices"])
 
-# Armazenar conexões WebSocket ativas
-active_connections: List[WebSocket] = []
+# Serializadores construídos uma única vez e reutilizados em todas as requisições
+_PRICES_ADAPTER = TypeAdapter(Dict[str, List[Price]])
+_OPPORTUNITIES_ADAPTER = TypeAdapter(List[ArbitrageOpportunity])
 
-async def broadcast_message(message: dict):
-    """Enviar mensagem para todas as conexões WebSocket ativas"""
-    if active_connections:
-        message_str = json.dumps(message)
-        disconnected = []
-        
-        for connection in active_connections:
-            try:
-                await connection.send_text(message_str)
-            except:
-                disconnected.append(connection)
-        
-        # Remover conexões desconectadas
-        for connection in disconnected:
-            active_connections.remove(connection)
+# Cache curto dos resultados do price_monitor: rajadas de requisições geram uma única busca
+_response_cache = AsyncTTLCache(ttl=settings.response_cache_ttl, maxsize=64)
+_CACHE_CONTROL = f"public, max-age={int(settings.response_cache_ttl)}"
+
+def _json_response(body: Union[bytes, str]) -> Response:
+    """Resposta com JSON já serializado (sem revalidação pelo FastAPI)"""
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Cache-Control": _CACHE_CONTROL}
+    )
+
+class _Topic:
+    """Clientes inscritos em um tópico, último frame publicado e o evento de renovação"""
+    
+    def __init__(self):
+        # Referências fracas: sockets coletados saem sozinhos do conjunto
+        self.subscribers: "weakref.WeakSet[WebSocket]" = weakref.WeakSet()
+        self.frame: Optional[bytes] = None
+        self.fingerprint: Optional[Hashable] = None
+        self.ready = asyncio.Event()
+    
+    def publish(self, frame: bytes, fingerprint: Hashable):
+        """Substituir o frame atual e acordar todos os clientes em espera"""
+        self.frame = frame
+        self.fingerprint = fingerprint
+        self.ready.set()
+        self.ready.clear()
+    
+    def reset(self):
+        """Descartar o último frame (sem clientes, ele deixaria de ser atualizado)"""
+        self.frame = None
+        self.fingerprint = None
 
-@router.get("/prices/{symbol}")
-async def get_prices(symbol: str) -> Dict[str, List[Price]]:
+# Tópicos de atualização via WebSocket (um cliente lento em um tópico não afeta o outro)
+price_topic = _Topic()
+arbitrage_topic = _Topic()
+
+# Tarefa do temporizador único de publicação
+_ticker_task: Optional[asyncio.Task] = None
+
+# Conexões WebSocket ativas neste worker (vaga reservada antes do handshake)
+_active_connections = 0
+
+# Os handlers retornam Response com JSON pronto; response_model serve apenas à documentação
+@router.get("/prices/{symbol}", response_model=SymbolPrices)
+async def get_prices(symbol: str) -> Response:
     """Obter preços de um símbolo específico de todas as exchanges"""
     try:
         symbol = symbol.upper()
-        logger.info(f"Getting prices for {symbol}")
+        logger.debug("Getting prices for %s", symbol)
         
         # Obter preços de todas as exchanges para o símbolo
-        from app.services.exchanges import exchange_manager
         prices_dict = await exchange_manager.get_all_prices(symbol)
         
-        # Converter para lista de objetos Price
-        prices = []
-        for exchange, price_value in prices_dict.items():
-            if price_value is not None:
-                price = Price(
-                    exchange=exchange,
-                    symbol=symbol,
-                    price=price_value
-                )
-                prices.append(price)
+        # Converter para lista de objetos Price (valores já normalizados pelo exchange_manager,
+        # então a validação do Pydantic é dispensada)
+        now = utc_now()
+        prices = [
+            Price.model_construct(exchange=exchange, symbol=symbol, price=price_value, timestamp=now)
+            for exchange, price_value in prices_dict.items()
+            if price_value is not None
+        ]
         
-        logger.info(f"Retrieved {len(prices)} prices for {symbol}")
-        return {"symbol": symbol, "prices": prices}
+        logger.debug("Retrieved %s prices for %s", len(prices), symbol)
+        return _json_response(SymbolPrices.model_construct(symbol=symbol, prices=prices).model_dump_json())
         
     except Exception as e:
-        logger.error(f"Erro ao obter preços para {symbol}: {e}")
+        logger.error("Erro ao obter preços para %s: %s", symbol, e)
         raise HTTPException(status_code=500, detail=f"Erro ao obter preços: {str(e)}")
 
-@router.get("/prices")
-async def get_all_prices() -> Dict[str, List[Price]]:
+@router.get("/prices", response_model=Dict[str, List[Price]])
+async def get_all_prices() -> Response:
     """Obter preços de todos os símbolos suportados"""
     try:
-        logger.info("Getting all prices")
-        all_prices = await price_monitor.get_all_prices()
-        return all_prices
+        logger.debug("Getting all prices")
+        all_prices = await _response_cache.get_or_set("prices", price_monitor.get_all_prices)
+        return _json_response(_PRICES_ADAPTER.dump_json(all_prices))
         
     except Exception as e:
-        logger.error(f"Erro ao obter todos os preços: {e}")
+        logger.error("Erro ao obter todos os preços: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao obter preços: {str(e)}")
 
-@router.get("/arbitrage")
-async def get_arbitrage_opportunities() -> List[ArbitrageOpportunity]:
+@router.get("/arbitrage", response_model=List[ArbitrageOpportunity])
+async def get_arbitrage_opportunities() -> Response:
     """Obter todas as oportunidades de arbitragem atuais"""
     try:
-        logger.info("Getting arbitrage opportunities")
-        opportunities = await price_monitor.get_all_arbitrage_opportunities()
-        return opportunities
+        logger.debug("Getting arbitrage opportunities")
+        opportunities = await _response_cache.get_or_set(
+            "arbitrage", price_monitor.get_all_arbitrage_opportunities
+        )
+        return _json_response(_OPPORTUNITIES_ADAPTER.dump_json(opportunities))
         
     except Exception as e:
-        logger.error(f"Erro ao obter oportunidades de arbitragem: {e}")
+        logger.error("Erro ao obter oportunidades de arbitragem: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao obter oportunidades: {str(e)}")
 
-@router.get("/arbitrage/{symbol}")
-async def get_arbitrage_opportunities_for_symbol(symbol: str) -> List[ArbitrageOpportunity]:
+@router.get("/arbitrage/{symbol}", response_model=List[ArbitrageOpportunity])
+async def get_arbitrage_opportunities_for_symbol(symbol: str) -> Response:
     """Obter oportunidades de arbitragem para um símbolo específico"""
     try:
         symbol = symbol.upper()
-        logger.info(f"Getting arbitrage opportunities for {symbol}")
-        opportunities = await price_monitor.find_arbitrage_opportunities(symbol)
-        return opportunities
+        logger.debug("Getting arbitrage opportunities for %s", symbol)
+        opportunities = await _response_cache.get_or_set(
+            ("arbitrage", symbol), lambda: price_monitor.find_arbitrage_opportunities(symbol)
+        )
+        return _json_response(_OPPORTUNITIES_ADAPTER.dump_json(opportunities))
         
     except Exception as e:
-        logger.error(f"Erro ao obter oportunidades de arbitragem para {symbol}: {e}")
+        logger.error("Erro ao obter oportunidades de arbitragem para %s: %s", symbol, e)
         raise HTTPException(status_code=500, detail=f"Erro ao obter oportunidades: {str(e)}")
 
-@router.get("/compare/{symbol}")
-async def compare_prices(symbol: str) -> PriceComparison:
+@router.get("/compare/{symbol}", response_model=PriceComparison)
+async def compare_prices(symbol: str) -> Response:
     """Comparar preços de um símbolo entre todas as exchanges"""
     try:
         symbol = symbol.upper()
-        logger.info(f"Comparing prices for {symbol}")
-        comparison = await price_monitor.get_price_comparison(symbol)
+        logger.debug("Comparing prices for %s", symbol)
+        comparison = await _response_cache.get_or_set(
+            ("compare", symbol), lambda: price_monitor.get_price_comparison(symbol)
+        )
         
         if not comparison:
             raise HTTPException(status_code=404, detail=f"Não foi possível obter preços para {symbol}")
         
-        return comparison
+        return _json_response(comparison.model_dump_json())
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro ao comparar preços para {symbol}: {e}")
+        logger.error("Erro ao comparar preços para %s: %s", symbol, e)
         raise HTTPException(status_code=500, detail=f"Erro ao comparar preços: {str(e)}")
 
+def _encode_frame(update: BaseModel) -> bytes:
+    """Serializar e comprimir (zlib) um frame uma única vez para todos os clientes
+    
+    Os frames são enviados como mensagens binárias; o cliente deve aplicar
+    zlib.decompress (ou equivalente, ex: pako.inflate) antes do parse do JSON.
+    """
+    return zlib.compress(update.model_dump_json().encode(), 6)
+
+def broadcast_message(topic: _Topic, update: BaseModel, fingerprint: Hashable):
+    """Publicar uma atualização para todos os clientes inscritos no tópico
+    
+    O frame é serializado e comprimido uma única vez; a entrega é concorrente,
+    feita pela tarefa de envio de cada conexão (_send_frames), de modo que um
+    cliente lento não atrasa os demais.
+    """
+    topic.publish(_encode_frame(update), fingerprint)
+
+async def _refresh_prices(timestamp: datetime):
+    """Buscar e serializar preços uma vez para todos os clientes"""
+    try:
+        all_prices = await price_monitor.get_all_prices()
+        
+        # Não reenviar se nenhum preço mudou desde o último frame
+        fingerprint = tuple(
+            (price.symbol, price.exchange, price.price)
+            for prices in all_prices.values() for price in prices
+        )
+        if fingerprint == price_topic.fingerprint:
+            return
+        
+        # Dados vêm do price_monitor já validados; não revalidar ao montar o frame
+        broadcast_message(
+            price_topic, PriceUpdate.model_construct(data=all_prices, timestamp=timestamp), fingerprint
+        )
+    except Exception as e:
+        logger.error("Erro ao publicar preços: %s", e)
+
+async def _refresh_arbitrage(timestamp: datetime):
+    """Buscar e serializar oportunidades uma vez para todos os clientes"""
+    try:
+        opportunities = await price_monitor.get_all_arbitrage_opportunities()
+        
+        # Não reenviar se nenhuma oportunidade mudou desde o último frame
+        fingerprint = tuple(
+            (opp.symbol, opp.buy_exchange, opp.sell_exchange, opp.buy_price, opp.sell_price)
+            for opp in opportunities
+        )
+        if fingerprint == arbitrage_topic.fingerprint:
+            return
+        
+        broadcast_message(
+            arbitrage_topic, ArbitrageUpdate.model_construct(data=opportunities, timestamp=timestamp), fingerprint
+        )
+    except Exception as e:
+        logger.error("Erro ao publicar oportunidades de arbitragem: %s", e)
+
+async def _ticker():
+    """Temporizador único que renova os frames de todos os tópicos a cada 30 segundos"""
+    while True:
+        await asyncio.sleep(30)
+        
+        # Timestamp único por ciclo, compartilhado por todos os tópicos
+        timestamp = utc_now()
+        
+        refreshes = []
+        if price_topic.subscribers:
+            refreshes.append(_refresh_prices(timestamp))
+        if arbitrage_topic.subscribers:
+            refreshes.append(_refresh_arbitrage(timestamp))
+        
+        await asyncio.gather(*refreshes)
+
+def start_publishers():
+    """Iniciar o temporizador de publicação (chamado no startup da aplicação)"""
+    global _ticker_task
+    if _ticker_task is None:
+        _ticker_task = asyncio.create_task(_ticker())
+
+async def stop_publishers():
+    """Cancelar o temporizador de publicação (chamado no shutdown da aplicação)"""
+    global _ticker_task
+    if _ticker_task is not None:
+        _ticker_task.cancel()
+        await asyncio.gather(_ticker_task, return_exceptions=True)
+        _ticker_task = None
+
+async def _send_frames(websocket: WebSocket, topic: _Topic):
+    """Enviar ao cliente cada novo frame publicado no tópico"""
+    # Frames só são reenviados quando os dados mudam: entregar o estado atual ao conectar
+    if topic.frame is not None:
+        await websocket.send_bytes(topic.frame)
+    
+    while True:
+        await topic.ready.wait()
+        await websocket.send_bytes(topic.frame)
+
+async def _wait_disconnect(websocket: WebSocket):
+    """Consumir mensagens do cliente até o fechamento da conexão"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+async def _stream_frames(websocket: WebSocket, topic: _Topic):
+    """Inscrever o cliente no tópico até que ele desconecte"""
+    topic.subscribers.add(websocket)
+    sender = asyncio.ensure_future(_send_frames(websocket, topic))
+    receiver = asyncio.ensure_future(_wait_disconnect(websocket))
+    
+    try:
+        # Termina quando o cliente fecha a conexão ou um envio falha
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        topic.subscribers.discard(websocket)
+        if not topic.subscribers:
+            topic.reset()
+
+async def _accept(websocket: WebSocket) -> bool:
+    """Aceitar a conexão, recusando-a se o limite do worker foi atingido
+    
+    A vaga é reservada antes do primeiro await, para que handshakes simultâneos
+    não ultrapassem o limite; quem recebe True deve chamar _release ao terminar.
+    """
+    global _active_connections
+    if _active_connections >= settings.max_ws_per_worker:
+        # 1013 (Try Again Later): o cliente deve reconectar mais tarde
+        logger.warning("WebSocket connection limit reached (%s)", settings.max_ws_per_worker)
+        await websocket.accept()
+        await websocket.close(code=1013, reason="server busy")
+        return False
+    
+    _active_connections += 1
+    try:
+        await websocket.accept()
+    except BaseException:
+        _release()
+        raise
+    
+    return True
+
+def _release():
+    """Liberar a vaga de uma conexão aceita por _accept"""
+    global _active_connections
+    _active_connections -= 1
+
 @router.websocket("/ws/prices")
 async def websocket_prices(websocket: WebSocket):
     """WebSocket para atualizações de preços em tempo real"""
-    await websocket.accept()
-    active_connections.append(websocket)
+    if not await _accept(websocket):
+        return
     logger.info("WebSocket connection established for prices")
     
     try:
-        while True:
-            # Enviar atualizações a cada 30 segundos
-            await asyncio.sleep(30)
-            
-            # Obter preços atuais
-            all_prices = await price_monitor.get_all_prices()
-            
-            # Enviar para o cliente
-            await websocket.send_json({
-                "type": "price_update",
-                "data": all_prices,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
+        await _stream_frames(websocket, price_topic)
+        logger.info("WebSocket client disconnected")
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
         logger.info("WebSocket client disconnected")
     except Exception as e:
-        logger.error(f"Erro no WebSocket: {e}")
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        logger.error("Erro no WebSocket: %s", e)
+    finally:
+        _release()
 
 @router.websocket("/ws/arbitrage")
 async def websocket_arbitrage(websocket: WebSocket):
     """WebSocket para atualizações de arbitragem em tempo real"""
-    await websocket.accept()
-    active_connections.append(websocket)
+    if not await _accept(websocket):
+        return
     logger.info("WebSocket connection established for arbitrage")
     
     try:
-        while True:
-            # Enviar atualizações a cada 30 segundos
-            await asyncio.sleep(30)
-            
-            # Obter oportunidades de arbitragem
-            opportunities = await price_monitor.get_all_arbitrage_opportunities()
-            
-            # Enviar para o cliente
-            await websocket.send_json({
-                "type": "arbitrage_update",
-                "data": opportunities,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
+        await _stream_frames(websocket, arbitrage_topic)
+        logger.info("WebSocket client disconnected")
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
         logger.info("WebSocket client disconnected")
     except Exception as e:
-        logger.error(f"Erro no WebSocket: {e}")
-        if websocket in active_connections:
-            active_connections.remove(websocket)
\ No newline at end of file
+        logger.error("Erro no WebSocket: %s", e)
+    finally:
+        _release()
@@ -29,6 +29,18 @@ class Settings:
         self.max_price_difference = float(os.getenv("MAX_PRICE_DIFFERENCE", "10.0"))
         self.update_interval = int(os.getenv("UPDATE_INTERVAL", "30"))
         
+        # Configurações de cache (segundos)
+        self.response_cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "5"))
+        self.price_cache_ttl_ms = int(os.getenv("PRICE_CACHE_TTL_MS", "500"))
+        
+        # Configurações das requisições às exchanges
+        self.exchange_timeout_ms = int(os.getenv("EXCHANGE_TIMEOUT_MS", "500"))
+        self.breaker_failure_threshold = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+        self.breaker_reset_seconds = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+        
+        # Configurações de WebSocket
+        self.max_ws_per_worker = int(os.getenv("MAX_WS_PER_WORKER", "700"))
+        
         # Configurações das exchanges (opcional)
         self.binance_api_key = os.getenv("BINANCE_API_KEY")
         self.binance_secret_key = os.getenv("BINANCE_SECRET_KEY")
@@ -3,20 +3,31 @@ Sistema de Monitoramento de Arbitragem de Criptomoedas
 FastAPI Backend
 """
 
-import os
+import asyncio
 import logging
+import sys
 import time
-from fastapi import FastAPI, Request
+import orjson
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from models.user import UserCreate, UserResponse
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.models.user import UserCreate, UserResponse
+from app.models.price import utc_now
+from app.api.prices import router as prices_router, start_publishers, stop_publishers
+from app.services.exchanges import exchange_manager
+from app.services.price_monitor import SUPPORTED_SYMBOLS
+from datetime import datetime, timezone
 import uvicorn
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Importar rotas apenas quando necessário para evitar problemas de inicialização
+# Com LOG_LEVEL=warning, silenciar também o access log por requisição do uvicorn
+if settings.log_level.lower() == "warning":
+    logging.getLogger("uvicorn.access").disabled = True
 
 # Criar instância do FastAPI
 app = FastAPI(
@@ -24,100 +35,104 @@ app = FastAPI(
     description="Sistema de monitoramento de oportunidades de arbitragem em criptomoedas",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# Configurar CORS para permitir requisições de qualquer domínio
+# Configurar CORS com as origens de ALLOWED_ORIGINS (padrão "*")
 # Especialmente importante para v0.dev e outros domínios de preview
-logger.info("🔗 Configurando CORS para permitir todas as origens")
+logger.info("🔗 Configurando CORS para as origens: %s", settings.allowed_origins)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Permite todas as origens (incluindo v0.dev)
+    allow_origins=settings.allowed_origins,  # "*" permite todas as origens (incluindo v0.dev)
     allow_credentials=True,  # Permite cookies e headers de autenticação
     allow_methods=["*"],  # Permite todos os métodos HTTP
     allow_headers=["*"],  # Permite todos os headers
 )
 
-logger.info("✅ CORS configurado com sucesso - permitindo todas as origens")
+logger.info("✅ CORS configurado com sucesso")
 
-# Middleware personalizado para logging de requisições CORS
-@app.middleware("http")
-async def cors_logging_middleware(request: Request, call_next):
+# Middleware personalizado para logging de requisições CORS (ASGI puro, sem BaseHTTPMiddleware)
+class CorsLoggingMiddleware:
     """Middleware para logging de requisições CORS"""
-    start_time = time.time()
     
-    # Log da requisição recebida
-    origin = request.headers.get("origin", "unknown")
-    method = request.method
-    path = request.url.path
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    logger.info(f"🌐 Requisição recebida: {method} {path} de origem: {origin}")
-    
-    # Processar a requisição
-    response = await call_next(request)
-    
-    # Calcular tempo de processamento
-    process_time = time.time() - start_time
-    
-    # Log da resposta
-    logger.info(f"✅ Resposta enviada: {response.status_code} em {process_time:.3f}s para {origin}")
-    
-    # Adicionar headers CORS explícitos para garantir compatibilidade
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    
-    return response
-
-# Incluir rotas (importação lazy para evitar problemas de startup)
-try:
-    from app.api.prices import router as prices_router
-    app.include_router(prices_router)
-    logger.info("Price routes loaded successfully")
-except Exception as e:
-    logger.warning(f"Failed to load price routes: {e}")
-    # Criar rotas básicas se houver falha
-    @app.get("/api/v1/prices/{symbol}")
-    async def fallback_prices(symbol: str):
-        return {"error": "Price service temporarily unavailable", "symbol": symbol}
-    
-    @app.get("/api/v1/arbitrage")
-    async def fallback_arbitrage():
-        return {"error": "Arbitrage service temporarily unavailable"}
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Sem INFO habilitado, repassar direto sem medir tempo nem envolver o send
+        if scope["type"] != "http" or not logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        
+        # Log da requisição recebida
+        method = scope["method"]
+        path = scope["path"]
+        
+        logger.info("Requisição recebida: %s %s", method, path)
+        # Cliente real (via --proxy-headers) e origem apenas em DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            origin = next((value for key, value in scope["headers"] if key == b"origin"), b"unknown")
+            logger.debug("Cliente: %s origem: %s", scope.get("client"), origin.decode("latin-1"))
+        
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # Log da resposta (headers CORS são emitidos pelo CORSMiddleware)
+                process_time = time.perf_counter() - start_time
+                logger.info("Resposta enviada: %s em %.3fs", message["status"], process_time)
+            await send(message)
+        
+        await self.app(scope, receive, send_wrapper)
+
+# Logging por requisição apenas em modo debug
+if settings.debug:
+    app.add_middleware(CorsLoggingMiddleware)
+
+# Incluir rotas (falhas de importação interrompem o startup em vez de servir rotas degradadas)
+app.include_router(prices_router)
+
+# Endpoints estáticos: corpos JSON serializados uma única vez na importação
+_ROOT_BODY = orjson.dumps({
+    "message": "Crypto Arbitrage Monitor API",
+    "version": "1.0.0",
+    "status": "online",
+    "docs": "/docs"
+})
 
 @app.get("/")
 async def root():
     """Endpoint raiz - informações básicas da API"""
-    return {
-        "message": "Crypto Arbitrage Monitor API",
-        "version": "1.0.0",
-        "status": "online",
-        "docs": "/docs"
-    }
+    return Response(content=_ROOT_BODY, media_type="application/json")
+
+# Parte fixa do /health serializada uma vez; só o timestamp é gerado por requisição
+_HEALTH_PREFIX = orjson.dumps({
+    "status": "healthy",
+    "service": "crypto-arbitrage-monitor",
+    "version": "1.0.0"
+})[:-1] + b',"timestamp":'
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    logger.info("Health check requested")
-    return {
-        "status": "healthy",
-        "service": "crypto-arbitrage-monitor",
-        "version": "1.0.0",
-        "timestamp": "2025-01-06T22:30:00Z"
-    }
+    logger.debug("Health check requested")
+    timestamp = orjson.dumps(datetime.now(timezone.utc), option=orjson.OPT_UTC_Z)
+    return Response(content=_HEALTH_PREFIX + timestamp + b"}", media_type="application/json")
 
+# response_model serve apenas à documentação: retornando um ORJSONResponse, o FastAPI
+# não valida a resposta com o Pydantic e o dict é serializado direto pelo orjson
 @app.post("/auth/register", response_model=UserResponse)
 async def register(user: UserCreate):
     """Register a new user"""
-    logger.info(f"User registration attempt for email: {user.email}")
-    return UserResponse(
-        id="temp-123",
-        email=user.email, 
-        name=user.name,
-        created_at=datetime.now().isoformat()
-    )
+    logger.debug("User registration attempt for email: %s", user.email)
+    return ORJSONResponse({
+        "id": "temp-123",
+        "email": user.email,
+        "name": user.name,
+        "created_at": utc_now().isoformat()
+    })
 
 @app.on_event("startup")
 async def startup_event():
@@ -127,17 +142,17 @@ async def startup_event():
     logger.info("🔗 Health endpoint available at /health")
     logger.info("📚 API documentation available at /docs")
     
-    # Verificar variáveis de ambiente
-    port = os.getenv("PORT", "8000")
-    host = os.getenv("HOST", "0.0.0.0")
-    logger.info(f"🌐 Starting server on {host}:{port}")
+    logger.info("🌐 Starting server on %s:%s", settings.host, settings.port)
+    logger.info("🔁 Event loop: %s", type(asyncio.get_running_loop()).__module__)
     
-    # Verificar se as rotas foram carregadas
-    try:
-        from app.api.prices import router as prices_router
-        logger.info("✅ Price monitoring routes loaded")
-    except Exception as e:
-        logger.warning(f"⚠️ Price routes not available: {e}")
+    # Abrir o pool de conexões HTTP compartilhado com as exchanges
+    await exchange_manager.start()
+    await exchange_manager.warm_up()
+    logger.info("🔌 Exchange HTTP client ready")
+    
+    # Iniciar publicação via WebSocket
+    start_publishers()
+    logger.info("📡 WebSocket publishers started")
     
     logger.info("✅ Application startup completed successfully")
 
@@ -145,64 +160,85 @@ async def startup_event():
 async def shutdown_event():
     """Evento de encerramento da aplicação"""
     logger.info("🛑 Application shutting down...")
+    
+    try:
+        await stop_publishers()
+    except Exception as e:
+        logger.warning("⚠️ Failed to stop WebSocket publishers: %s", e)
+    
+    try:
+        await exchange_manager.close_all()
+    except Exception as e:
+        logger.warning("⚠️ Failed to close exchange HTTP client: %s", e)
+    
     logger.info("✅ Shutdown completed")
 
+_STATUS_BODY = orjson.dumps({
+    "api_status": "operational",
+    "cors_enabled": True,
+    "cors_origins": settings.allowed_origins,
+    "endpoints": {
+        "health": "/health",
+        "docs": "/docs",
+        "redoc": "/redoc",
+        "prices": "/api/v1/prices",
+        "arbitrage": "/api/v1/arbitrage",
+        "websocket_prices": "/api/v1/ws/prices",
+        "websocket_arbitrage": "/api/v1/ws/arbitrage",
+        "cors_test": "/api/v1/cors-test"
+    },
+    "supported_symbols": SUPPORTED_SYMBOLS,
+    "exchanges": ["binance", "coinbase", "kraken"]
+})
+
 @app.get("/api/v1/status")
 async def api_status():
     """Status da API"""
-    return {
-        "api_status": "operational",
-        "cors_enabled": True,
-        "cors_origins": ["*"],
-        "endpoints": {
-            "health": "/health",
-            "docs": "/docs",
-            "redoc": "/redoc",
-            "prices": "/api/v1/prices",
-            "arbitrage": "/api/v1/arbitrage",
-            "websocket_prices": "/api/v1/ws/prices",
-            "websocket_arbitrage": "/api/v1/ws/arbitrage",
-            "cors_test": "/api/v1/cors-test"
-        },
-        "supported_symbols": ["BTC", "ETH"],
-        "exchanges": ["binance", "coinbase", "kraken"]
-    }
+    return Response(content=_STATUS_BODY, media_type="application/json")
+
+_CORS_TEST_BODY = orjson.dumps({
+    "message": "CORS funcionando corretamente!",
+    "cors_headers": {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
+        "Access-Control-Allow-Headers": "*",
+        "Access-Control-Allow-Credentials": "true"
+    },
+    "timestamp": "2025-01-06T22:30:00Z"
+})
 
 @app.get("/api/v1/cors-test")
 async def cors_test():
     """Endpoint para testar CORS"""
-    return {
-        "message": "CORS funcionando corretamente!",
-        "cors_headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Allow-Credentials": "true"
-        },
-        "timestamp": "2025-01-06T22:30:00Z"
-    }
+    return Response(content=_CORS_TEST_BODY, media_type="application/json")
 
 if __name__ == "__main__":
-    # Obter configurações das variáveis de ambiente
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", 8000))
-    debug = os.getenv("DEBUG", "false").lower() == "true"
-    log_level = os.getenv("LOG_LEVEL", "info")
+    logger.info("🚀 Starting Crypto Arbitrage Monitor")
+    logger.info("🌐 Host: %s", settings.host)
+    logger.info("🔌 Port: %s", settings.port)
+    logger.info("🐛 Debug: %s", settings.debug)
+    logger.info("📝 Log Level: %s", settings.log_level)
     
-    logger.info(f"🚀 Starting Crypto Arbitrage Monitor")
-    logger.info(f"🌐 Host: {host}")
-    logger.info(f"🔌 Port: {port}")
-    logger.info(f"🐛 Debug: {debug}")
-    logger.info(f"📝 Log Level: {log_level}")
+    # uvloop (event loop em C sobre libuv) só existe em POSIX
+    loop = "uvloop" if sys.platform != "win32" else "asyncio"
+    logger.info("🔁 Event loop: %s", loop)
     
     try:
         uvicorn.run(
-            "main:app",
-            host=host,
-            port=port,
-            reload=debug,
-            log_level=log_level
+            "app.main:app",
+            host=settings.host,
+            port=settings.port,
+            reload=settings.debug,
+            log_level=settings.log_level,
+            loop=loop,
+            http="httptools",
+            ws="websockets",
+            # Frames já são comprimidos uma vez no publisher (zlib)
+            ws_per_message_deflate=False,
+            # IP/esquema reais do cliente atrás do proxy do Railway
+            proxy_headers=True,
+            forwarded_allow_ips="*"
         )
     except Exception as e:
-        logger.error(f"❌ Failed to start server: {e}")
+        logger.error("❌ Failed to start server: %s", e)
         raise
\ No newline at end of file
@@ -2,21 +2,20 @@
 Modelos de dados para preços e oportunidades de arbitragem
 """
 
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Literal
 from pydantic import BaseModel, Field
 
+def utc_now() -> datetime:
+    """Obter o horário atual em UTC (substitui o depreciado datetime.utcnow)"""
+    return datetime.now(timezone.utc)
+
 class Price(BaseModel):
     """Modelo para preço de criptomoeda"""
     exchange: str = Field(..., description="Nome da exchange")
     symbol: str = Field(..., description="Símbolo da criptomoeda (ex: BTCUSDT)")
     price: float = Field(..., description="Preço atual")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp do preço")
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    timestamp: datetime = Field(default_factory=utc_now, description="Timestamp do preço")
 
 class ArbitrageOpportunity(BaseModel):
     """Modelo para oportunidade de arbitragem"""
@@ -27,12 +26,12 @@ class ArbitrageOpportunity(BaseModel):
     sell_price: float = Field(..., description="Preço de venda")
     profit_percentage: float = Field(..., description="Percentual de lucro")
     profit_amount: float = Field(..., description="Valor do lucro")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp da oportunidade")
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    timestamp: datetime = Field(default_factory=utc_now, description="Timestamp da oportunidade")
+
+class SymbolPrices(BaseModel):
+    """Modelo para preços de um símbolo em todas as exchanges"""
+    symbol: str = Field(..., description="Símbolo da criptomoeda")
+    prices: List[Price] = Field(..., description="Lista de preços por exchange")
 
 class PriceComparison(BaseModel):
     """Modelo para comparação de preços entre exchanges"""
@@ -42,9 +41,16 @@ class PriceComparison(BaseModel):
     lowest_price: Price = Field(..., description="Menor preço encontrado")
     price_difference: float = Field(..., description="Diferença absoluta de preço")
     price_difference_percentage: float = Field(..., description="Diferença percentual de preço")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp da comparação")
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
\ No newline at end of file
+    timestamp: datetime = Field(default_factory=utc_now, description="Timestamp da comparação")
+
+class PriceUpdate(BaseModel):
+    """Mensagem WebSocket com atualização de preços"""
+    type: Literal["price_update"] = Field("price_update", description="Tipo da mensagem")
+    data: Dict[str, List[Price]] = Field(..., description="Preços por símbolo")
+    timestamp: datetime = Field(..., description="Timestamp da atualização")
+
+class ArbitrageUpdate(BaseModel):
+    """Mensagem WebSocket com atualização de oportunidades de arbitragem"""
+    type: Literal["arbitrage_update"] = Field("arbitrage_update", description="Tipo da mensagem")
+    data: List[ArbitrageOpportunity] = Field(..., description="Oportunidades de arbitragem")
+    timestamp: datetime = Field(..., description="Timestamp da atualização")
\ No newline at end of file
@@ -4,93 +4,229 @@ Clientes de API para exchanges de criptomoedas
 
 import httpx
 import asyncio
-from typing import Dict, Optional, List
+import json
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Optional, List, Sequence, Set
 from datetime import datetime
 import logging
 
+from app.config import settings
+from app.utils.cache import AsyncTTLCache
+
 logger = logging.getLogger(__name__)
 
+# Cliente HTTP compartilhado por todas as exchanges (pool keep-alive + HTTP/2)
+_shared_client: Optional[httpx.AsyncClient] = None
+
+def get_shared_client() -> httpx.AsyncClient:
+    """Obter o cliente HTTP compartilhado, criando-o de forma lazy"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            # keepalive_expiry acima do intervalo de 30 s do ticker: conexões ociosas
+            # entre publicações (e as abertas no warm-up) continuam reutilizáveis
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=128, keepalive_expiry=60.0)
+        )
+    return _shared_client
+
+async def close_shared_client():
+    """Fechar o cliente HTTP compartilhado"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
+@lru_cache(maxsize=64)
+def _binance_symbol(symbol: str) -> str:
+    """Converter símbolo para formato Binance (ex: BTC -> BTCUSDT)"""
+    return symbol if symbol.endswith("USDT") else f"{symbol}USDT"
+
+@lru_cache(maxsize=64)
+def _coinbase_symbol(symbol: str) -> str:
+    """Converter símbolo para formato Coinbase (ex: BTC -> BTC-USD)"""
+    return symbol if symbol.endswith("-USD") else f"{symbol}-USD"
+
+# Pares da Kraken por símbolo (ex: BTC -> XXBTZUSD)
+_KRAKEN_PAIRS = {
+    "BTC": "XXBTZUSD",
+    "ETH": "XETHZUSD",
+    "BTCUSDT": "XXBTZUSD",
+    "ETHUSDT": "XETHZUSD"
+}
+
+# Símbolos com par conhecido em todas as exchanges: só eles entram nas requisições em lote,
+# já que Binance e Kraken rejeitam o lote inteiro se um único par for inválido
+_BATCH_SYMBOLS = frozenset(_KRAKEN_PAIRS)
+
+# Prazo por requisição apenas na fase de resposta: o estabelecimento da conexão
+# (TCP+TLS+HTTP/2) tem prazo próprio para que reconexões frias possam completar
+_REQUEST_TIMEOUT = httpx.Timeout(settings.exchange_timeout_ms / 1000, connect=2.0, pool=2.0)
+
+# Limite total do warm-up das conexões no startup (segundos)
+_WARM_UP_TIMEOUT = 2.0
+
 class BaseExchangeClient:
     """Cliente base para exchanges"""
     
     def __init__(self, name: str, base_url: str):
         self.name = name
         self.base_url = base_url
-        self.client = None
+        # Endpoint leve usado apenas para abrir a conexão no warm-up
+        self.ping_url = base_url
+        # Exchanges com endpoint de vários símbolos sobrescrevem _get_prices_batch
+        self.supports_batch = False
+        # Circuit breaker: após falhas consecutivas a exchange é ignorada por um tempo
+        self._failures = 0
+        self._open_until = 0.0
     
     async def _get_client(self):
-        """Obter cliente HTTP de forma lazy"""
-        if self.client is None:
-            try:
-                self.client = httpx.AsyncClient(timeout=10.0)
-            except Exception as e:
-                logger.warning(f"Failed to create HTTP client for {self.name}: {e}")
-                return None
-        return self.client
+        """Obter o cliente HTTP compartilhado"""
+        try:
+            return get_shared_client()
+        except Exception as e:
+            logger.warning(f"Failed to create HTTP client for {self.name}: {e}")
+            return None
+    
+    def _circuit_open(self) -> bool:
+        """Verificar se a exchange está temporariamente desativada pelo circuit breaker"""
+        return time.monotonic() < self._open_until
+    
+    def _record_failure(self):
+        """Contar uma falha da exchange e abrir o circuito ao atingir o limite"""
+        self._failures += 1
+        if self._failures >= settings.breaker_failure_threshold:
+            self._open_until = time.monotonic() + settings.breaker_reset_seconds
+            self._failures = 0
+            logger.warning("⚠️ %s desativada por %.0fs após falhas consecutivas", self.name, settings.breaker_reset_seconds)
+    
+    async def _get_json(self, client: httpx.AsyncClient, url: str, params: Optional[dict] = None):
+        """GET com prazo por requisição, registrando sucesso/falha no circuit breaker
+        
+        Apenas timeouts, erros de transporte e respostas 5xx contam como falha da
+        exchange; erros 4xx (ex: símbolo inválido) e a espera por uma conexão livre
+        no pool local são propagados sem afetar o circuito.
+        """
+        try:
+            response = await client.get(url, params=params, timeout=_REQUEST_TIMEOUT)
+        except httpx.PoolTimeout:
+            raise
+        except httpx.TransportError:
+            self._record_failure()
+            raise
+        
+        if response.is_server_error:
+            self._record_failure()
+        response.raise_for_status()
+        
+        self._failures = 0
+        return response.json()
     
     async def get_price(self, symbol: str) -> Optional[float]:
         """Método abstrato para obter preço"""
         raise NotImplementedError
     
-    async def close(self):
-        """Fechar cliente HTTP"""
-        if self.client:
-            await self.client.aclose()
-            self.client = None
+    async def _get_prices_batch(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Obter preços de vários símbolos conhecidos em uma única requisição (se suportado)"""
+        raise NotImplementedError
+    
+    async def get_prices(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Obter preços de vários símbolos
+        
+        Símbolos conhecidos vão em lote quando a exchange suporta; os demais
+        (entrada do usuário) são buscados um a um, sem afetar o lote.
+        """
+        batch = [symbol for symbol in symbols if symbol in _BATCH_SYMBOLS] if self.supports_batch else []
+        single = [symbol for symbol in symbols if symbol not in batch]
+        
+        if not batch:
+            results = await asyncio.gather(*(self.get_price(symbol) for symbol in single))
+            return dict(zip(single, results))
+        
+        batch_prices, *results = await asyncio.gather(
+            self._get_prices_batch(batch),
+            *(self.get_price(symbol) for symbol in single)
+        )
+        return {**batch_prices, **dict(zip(single, results))}
 
 class BinanceClient(BaseExchangeClient):
     """Cliente para Binance API"""
     
     def __init__(self):
         super().__init__("binance", "https://api.binance.com")
+        self._ticker_url = f"{self.base_url}/api/v3/ticker/price"
+        self.ping_url = f"{self.base_url}/api/v3/ping"
+        self.supports_batch = True
     
     async def get_price(self, symbol: str) -> Optional[float]:
         """Obter preço da Binance"""
+        if self._circuit_open():
+            return None
+        
         try:
             client = await self._get_client()
             if not client:
                 return None
                 
-            # Converter símbolo para formato Binance (ex: BTC -> BTCUSDT)
-            if not symbol.endswith('USDT'):
-                symbol = f"{symbol}USDT"
-            
-            url = f"{self.base_url}/api/v3/ticker/price"
-            params = {"symbol": symbol}
+            params = {"symbol": _binance_symbol(symbol)}
             
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get_json(client, self._ticker_url, params)
             return float(data["price"])
             
         except Exception as e:
             logger.error(f"Erro ao obter preço da Binance para {symbol}: {e}")
             return None
+    
+    async def _get_prices_batch(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Obter preços de vários símbolos da Binance em uma única requisição"""
+        if self._circuit_open():
+            return {}
+        
+        try:
+            client = await self._get_client()
+            if not client:
+                return {}
+            
+            # Converter símbolos para formato Binance (ex: BTC -> BTCUSDT)
+            wire_symbols = {symbol: _binance_symbol(symbol) for symbol in symbols}
+            
+            params = {"symbols": json.dumps(list(dict.fromkeys(wire_symbols.values())), separators=(",", ":"))}
+            
+            data = await self._get_json(client, self._ticker_url, params)
+            
+            prices = {ticker["symbol"]: float(ticker["price"]) for ticker in data}
+            return {
+                symbol: prices[wire_symbol]
+                for symbol, wire_symbol in wire_symbols.items()
+                if wire_symbol in prices
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter preços da Binance para {symbols}: {e}")
+            return {}
 
 class CoinbaseClient(BaseExchangeClient):
     """Cliente para Coinbase Pro API"""
     
     def __init__(self):
         super().__init__("coinbase", "https://api.exchange.coinbase.com")
+        self.ping_url = f"{self.base_url}/time"
     
     async def get_price(self, symbol: str) -> Optional[float]:
         """Obter preço da Coinbase"""
+        if self._circuit_open():
+            return None
+        
         try:
             client = await self._get_client()
             if not client:
                 return None
                 
-            # Converter símbolo para formato Coinbase (ex: BTC -> BTC-USD)
-            if not symbol.endswith('-USD'):
-                symbol = f"{symbol}-USD"
-            
-            url = f"{self.base_url}/products/{symbol}/ticker"
+            url = f"{self.base_url}/products/{_coinbase_symbol(symbol)}/ticker"
             
-            response = await client.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get_json(client, url)
             return float(data["price"])
             
         except Exception as e:
@@ -102,31 +238,26 @@ class KrakenClient(BaseExchangeClient):
     
     def __init__(self):
         super().__init__("kraken", "https://api.kraken.com")
+        self._ticker_url = f"{self.base_url}/0/public/Ticker"
+        self.ping_url = f"{self.base_url}/0/public/Time"
+        self.supports_batch = True
     
     async def get_price(self, symbol: str) -> Optional[float]:
         """Obter preço da Kraken"""
+        if self._circuit_open():
+            return None
+        
         try:
             client = await self._get_client()
             if not client:
                 return None
                 
             # Converter símbolo para formato Kraken (ex: BTC -> XXBTZUSD)
-            symbol_mapping = {
-                "BTC": "XXBTZUSD",
-                "ETH": "XETHZUSD",
-                "BTCUSDT": "XXBTZUSD",
-                "ETHUSDT": "XETHZUSD"
-            }
+            kraken_symbol = _KRAKEN_PAIRS.get(symbol, symbol)
             
-            kraken_symbol = symbol_mapping.get(symbol, symbol)
-            
-            url = f"{self.base_url}/0/public/Ticker"
             params = {"pair": kraken_symbol}
             
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get_json(client, self._ticker_url, params)
             
             if "result" in data and kraken_symbol in data["result"]:
                 ticker_data = data["result"][kraken_symbol]
@@ -138,6 +269,100 @@ class KrakenClient(BaseExchangeClient):
         except Exception as e:
             logger.error(f"Erro ao obter preço da Kraken para {symbol}: {e}")
             return None
+    
+    async def _get_prices_batch(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Obter preços de vários símbolos da Kraken em uma única requisição"""
+        if self._circuit_open():
+            return {}
+        
+        try:
+            client = await self._get_client()
+            if not client:
+                return {}
+            
+            # Converter símbolos para formato Kraken (ex: BTC -> XXBTZUSD)
+            kraken_symbols = {symbol: _KRAKEN_PAIRS.get(symbol, symbol) for symbol in symbols}
+            
+            params = {"pair": ",".join(dict.fromkeys(kraken_symbols.values()))}
+            
+            data = await self._get_json(client, self._ticker_url, params)
+            
+            result = data.get("result", {})
+            
+            # Usar preço de venda (ask) como referência
+            return {
+                symbol: float(result[kraken_symbol]["a"][0])
+                for symbol, kraken_symbol in kraken_symbols.items()
+                if kraken_symbol in result
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter preços da Kraken para {symbols}: {e}")
+            return {}
+
+class SymbolBatcher:
+    """Agrupar pedidos de preço por símbolo feitos dentro de uma mesma janela de tempo
+    
+    Pedidos que chegam dentro de `window` segundos são resolvidos por uma única
+    chamada a `fetch` com todos os símbolos pendentes.
+    """
+    
+    def __init__(self, fetch: Callable[[List[str]], Awaitable[Dict[str, Dict[str, Optional[float]]]]],
+                 window: float = 0.02):
+        self._fetch = fetch
+        self.window = window
+        self._pending: Dict[str, asyncio.Future] = {}
+        # Lote aberto na janela atual e todos os lotes ainda em execução
+        self._flush_task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def get(self, symbol: str) -> Dict[str, Optional[float]]:
+        """Obter preços de todas as exchanges para um símbolo via lote"""
+        future = self._pending.get(symbol)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[symbol] = future
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush())
+                self._tasks.add(self._flush_task)
+                self._flush_task.add_done_callback(self._tasks.discard)
+        
+        # shield: cancelar um chamador não cancela o resultado compartilhado
+        return await asyncio.shield(future)
+    
+    async def _flush(self):
+        """Aguardar a janela e buscar todos os símbolos pendentes de uma vez"""
+        pending = self._pending
+        
+        try:
+            await asyncio.sleep(self.window)
+            self._pending = {}
+            self._flush_task = None
+            
+            results = await self._fetch(list(pending))
+            for symbol, future in pending.items():
+                future.set_result(results.get(symbol, {}))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+        finally:
+            # Cancelamento (ex: shutdown): nenhum chamador pode ficar esperando para sempre
+            if self._pending is pending:
+                self._pending = {}
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+            for future in pending.values():
+                if not future.done():
+                    future.cancel()
+    
+    async def close(self):
+        """Cancelar os lotes em andamento (chamado no shutdown)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 class ExchangeManager:
     """Gerenciador de exchanges"""
@@ -145,6 +370,9 @@ class ExchangeManager:
     def __init__(self):
         self.exchanges = {}
         self._initialized = False
+        self._batcher = SymbolBatcher(self._fetch_all_prices)
+        # Cache curto por símbolo: chamadores concorrentes compartilham uma única busca
+        self._price_cache = AsyncTTLCache(ttl=settings.price_cache_ttl_ms / 1000, maxsize=64)
     
     def _initialize_exchanges(self):
         """Inicializar exchanges apenas quando necessário"""
@@ -182,37 +410,86 @@ class ExchangeManager:
                 self._initialized = True
     
     async def get_all_prices(self, symbol: str) -> Dict[str, Optional[float]]:
-        """Obter preços de todas as exchanges simultaneamente"""
+        """Obter preços de todas as exchanges simultaneamente
+        
+        Resultados recentes são servidos do cache; chamadas concorrentes para
+        símbolos diferentes são agrupadas em um único lote.
+        """
+        return await self._price_cache.get_or_set(symbol, lambda: self._batcher.get(symbol))
+    
+    async def get_all_prices_multi(self, symbols: Sequence[str]) -> Dict[str, Dict[str, Optional[float]]]:
+        """Obter preços de vários símbolos em todas as exchanges simultaneamente"""
+        results = await asyncio.gather(*(self.get_all_prices(symbol) for symbol in symbols))
+        return dict(zip(symbols, results))
+    
+    async def _fetch_all_prices(self, symbols: List[str]) -> Dict[str, Dict[str, Optional[float]]]:
+        """Buscar preços de vários símbolos nas exchanges, sem cache"""
         self._initialize_exchanges()
         
         if not self.exchanges:
             logger.warning("No exchanges available")
             return {}
         
-        tasks = []
-        exchange_names = []
+        async with asyncio.TaskGroup() as tg:
+            tasks = {
+                name: tg.create_task(self._safe_get_prices(name, client, symbols))
+                for name, client in self.exchanges.items()
+            }
+        
+        prices = {symbol: {} for symbol in symbols}
+        for exchange_name, task in tasks.items():
+            result = task.result()
+            for symbol in symbols:
+                prices[symbol][exchange_name] = result.get(symbol)
+        
+        return prices
+    
+    @staticmethod
+    async def _safe_get_prices(name: str, client: BaseExchangeClient,
+                               symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Buscar preços de uma exchange sem propagar erros (não cancela as demais no TaskGroup)"""
+        try:
+            return await client.get_prices(symbols)
+        except Exception as e:
+            logger.error("Erro na exchange %s: %s", name, e)
+            return {}
+    
+    async def start(self):
+        """Inicializar exchanges e abrir o pool de conexões HTTP compartilhado"""
+        self._initialize_exchanges()
+        get_shared_client()
+    
+    async def warm_up(self):
+        """Abrir as conexões (TCP+TLS/HTTP2) com cada exchange antes do primeiro pedido real
         
-        for name, client in self.exchanges.items():
-            tasks.append(client.get_price(symbol))
-            exchange_names.append(name)
+        Usa GET direto, sem o prazo por requisição nem o circuit breaker: um handshake
+        frio mais lento que o prazo seria cancelado e contado como falha da exchange.
+        O conjunto todo tem um limite próprio para não atrasar o startup (e o /health).
+        """
+        if not self.exchanges:
+            return
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        client = get_shared_client()
+        tasks = {
+            name: asyncio.ensure_future(client.get(exchange.ping_url))
+            for name, exchange in self.exchanges.items()
+        }
         
-        prices = {}
-        for i, result in enumerate(results):
-            exchange_name = exchange_names[i]
-            if isinstance(result, Exception):
-                logger.error(f"Erro na exchange {exchange_name}: {result}")
-                prices[exchange_name] = None
-            else:
-                prices[exchange_name] = result
+        _, pending = await asyncio.wait(tasks.values(), timeout=_WARM_UP_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
         
-        return prices
+        for name, task in tasks.items():
+            if task in pending:
+                logger.warning("⚠️ Warm-up da %s excedeu %.0fs", name, _WARM_UP_TIMEOUT)
+            elif task.exception() is not None:
+                logger.warning("⚠️ Warm-up da %s falhou: %s", name, task.exception())
     
     async def close_all(self):
-        """Fechar todas as conexões"""
-        for client in self.exchanges.values():
-            await client.close()
+        """Cancelar o lote pendente e fechar todas as conexões"""
+        await self._batcher.close()
+        await close_shared_client()
 
 # Instância global do gerenciador (inicialização lazy)
 exchange_manager = ExchangeManager()
\ No newline at end of file
@@ -2,62 +2,93 @@
 Serviço de monitoramento de preços e detecção de arbitragem
 """
 
-import asyncio
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import logging
 
-from app.models.price import Price, ArbitrageOpportunity, PriceComparison
+from app.models.price import Price, ArbitrageOpportunity, PriceComparison, utc_now
 from app.services.exchanges import exchange_manager
 
 logger = logging.getLogger(__name__)
 
+# Símbolos monitorados (imutável; compartilhado com o endpoint de status)
+SUPPORTED_SYMBOLS: Tuple[str, ...] = ("BTC", "ETH")
+
 class PriceMonitorService:
     """Serviço para monitoramento de preços e detecção de arbitragem"""
     
     def __init__(self, min_profit_percentage: float = 0.5):
         self.min_profit_percentage = min_profit_percentage
-        self.supported_symbols = ["BTC", "ETH"]
+        self.supported_symbols = SUPPORTED_SYMBOLS
+    
+    def _build_comparison(self, symbol: str, prices_dict: Dict[str, Optional[float]],
+                          now: datetime) -> Optional[PriceComparison]:
+        """Montar a comparação de preços a partir de preços já obtidos (sem I/O)"""
+        # Criar objetos Price (valores já normalizados pelo exchange_manager)
+        prices = [
+            Price.model_construct(
+                exchange=exchange,
+                symbol=symbol,
+                price=price_value,
+                timestamp=now
+            )
+            for exchange, price_value in prices_dict.items()
+            if price_value is not None
+        ]
+        
+        if len(prices) < 2:
+            logger.warning(f"Preços insuficientes para {symbol}: {len(prices)} exchanges")
+            return None
+        
+        # Encontrar maior e menor preço em uma única passada
+        highest_price = lowest_price = prices[0]
+        for price in prices[1:]:
+            if price.price > highest_price.price:
+                highest_price = price
+            elif price.price < lowest_price.price:
+                lowest_price = price
+        
+        # Calcular diferenças
+        price_difference = highest_price.price - lowest_price.price
+        price_difference_percentage = (price_difference / lowest_price.price) * 100
+        
+        return PriceComparison.model_construct(
+            symbol=symbol,
+            prices=prices,
+            highest_price=highest_price,
+            lowest_price=lowest_price,
+            price_difference=price_difference,
+            price_difference_percentage=price_difference_percentage,
+            timestamp=now
+        )
+    
+    def _build_opportunity(self, price_comparison: Optional[PriceComparison]) -> Optional[ArbitrageOpportunity]:
+        """Converter uma comparação em oportunidade de arbitragem, se o lucro for significativo"""
+        if not price_comparison:
+            return None
+        
+        # Verificar se a diferença de preço é significativa
+        if price_comparison.price_difference_percentage < self.min_profit_percentage:
+            return None
+        
+        # Comprar na exchange com menor preço, vender na com maior preço
+        return ArbitrageOpportunity.model_construct(
+            symbol=price_comparison.symbol,
+            buy_exchange=price_comparison.lowest_price.exchange,
+            sell_exchange=price_comparison.highest_price.exchange,
+            buy_price=price_comparison.lowest_price.price,
+            sell_price=price_comparison.highest_price.price,
+            profit_percentage=price_comparison.price_difference_percentage,
+            profit_amount=price_comparison.price_difference,
+            timestamp=price_comparison.timestamp
+        )
     
     async def get_price_comparison(self, symbol: str) -> Optional[PriceComparison]:
         """Obter comparação de preços entre todas as exchanges"""
         try:
             # Obter preços de todas as exchanges
             prices_dict = await exchange_manager.get_all_prices(symbol)
-            
-            # Criar objetos Price
-            prices = []
-            for exchange, price_value in prices_dict.items():
-                if price_value is not None:
-                    price = Price(
-                        exchange=exchange,
-                        symbol=symbol,
-                        price=price_value,
-                        timestamp=datetime.utcnow()
-                    )
-                    prices.append(price)
-            
-            if len(prices) < 2:
-                logger.warning(f"Preços insuficientes para {symbol}: {len(prices)} exchanges")
-                return None
-            
-            # Encontrar maior e menor preço
-            highest_price = max(prices, key=lambda p: p.price)
-            lowest_price = min(prices, key=lambda p: p.price)
-            
-            # Calcular diferenças
-            price_difference = highest_price.price - lowest_price.price
-            price_difference_percentage = (price_difference / lowest_price.price) * 100
-            
-            return PriceComparison(
-                symbol=symbol,
-                prices=prices,
-                highest_price=highest_price,
-                lowest_price=lowest_price,
-                price_difference=price_difference,
-                price_difference_percentage=price_difference_percentage,
-                timestamp=datetime.utcnow()
-            )
+            return self._build_comparison(symbol, prices_dict, utc_now())
             
         except Exception as e:
             logger.error(f"Erro ao obter comparação de preços para {symbol}: {e}")
@@ -65,51 +96,30 @@ class PriceMonitorService:
     
     async def find_arbitrage_opportunities(self, symbol: str) -> List[ArbitrageOpportunity]:
         """Encontrar oportunidades de arbitragem para um símbolo"""
-        opportunities = []
-        
         try:
-            price_comparison = await self.get_price_comparison(symbol)
-            
-            if not price_comparison:
-                return opportunities
-            
-            # Verificar se a diferença de preço é significativa
-            if price_comparison.price_difference_percentage < self.min_profit_percentage:
-                return opportunities
-            
-            # Criar oportunidade de arbitragem
-            # Comprar na exchange com menor preço, vender na com maior preço
-            opportunity = ArbitrageOpportunity(
-                symbol=symbol,
-                buy_exchange=price_comparison.lowest_price.exchange,
-                sell_exchange=price_comparison.highest_price.exchange,
-                buy_price=price_comparison.lowest_price.price,
-                sell_price=price_comparison.highest_price.price,
-                profit_percentage=price_comparison.price_difference_percentage,
-                profit_amount=price_comparison.price_difference,
-                timestamp=datetime.utcnow()
-            )
-            
-            opportunities.append(opportunity)
+            opportunity = self._build_opportunity(await self.get_price_comparison(symbol))
+            return [opportunity] if opportunity else []
             
         except Exception as e:
             logger.error(f"Erro ao encontrar oportunidades de arbitragem para {symbol}: {e}")
-        
-        return opportunities
+            return []
     
     async def get_all_arbitrage_opportunities(self) -> List[ArbitrageOpportunity]:
         """Obter todas as oportunidades de arbitragem para todos os símbolos suportados"""
         all_opportunities = []
         
-        # Processar todos os símbolos simultaneamente
-        tasks = [self.find_arbitrage_opportunities(symbol) for symbol in self.supported_symbols]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.error(f"Erro ao processar {self.supported_symbols[i]}: {result}")
-            else:
-                all_opportunities.extend(result)
+        try:
+            # Uma única rodada de requisições por exchange; o cálculo é feito em memória
+            prices_by_symbol = await exchange_manager.get_all_prices_multi(self.supported_symbols)
+            now = utc_now()
+            
+            for symbol, prices_dict in prices_by_symbol.items():
+                opportunity = self._build_opportunity(self._build_comparison(symbol, prices_dict, now))
+                if opportunity:
+                    all_opportunities.append(opportunity)
+                    
+        except Exception as e:
+            logger.error(f"Erro ao obter oportunidades de arbitragem: {e}")
         
         # Ordenar por percentual de lucro (maior primeiro)
         all_opportunities.sort(key=lambda x: x.profit_percentage, reverse=True)
@@ -118,28 +128,27 @@ class PriceMonitorService:
     
     async def get_all_prices(self) -> Dict[str, List[Price]]:
         """Obter preços de todos os símbolos de todas as exchanges"""
-        all_prices = {}
+        all_prices = {symbol: [] for symbol in self.supported_symbols}
         
-        for symbol in self.supported_symbols:
-            try:
-                prices_dict = await exchange_manager.get_all_prices(symbol)
-                prices = []
-                
-                for exchange, price_value in prices_dict.items():
-                    if price_value is not None:
-                        price = Price(
-                            exchange=exchange,
-                            symbol=symbol,
-                            price=price_value,
-                            timestamp=datetime.utcnow()
-                        )
-                        prices.append(price)
-                
-                all_prices[symbol] = prices
+        try:
+            # Uma única rodada de requisições por exchange para todos os símbolos
+            prices_by_symbol = await exchange_manager.get_all_prices_multi(self.supported_symbols)
+            now = utc_now()
+            
+            for symbol, prices_dict in prices_by_symbol.items():
+                all_prices[symbol] = [
+                    Price.model_construct(
+                        exchange=exchange,
+                        symbol=symbol,
+                        price=price_value,
+                        timestamp=now
+                    )
+                    for exchange, price_value in prices_dict.items()
+                    if price_value is not None
+                ]
                 
-            except Exception as e:
-                logger.error(f"Erro ao obter preços para {symbol}: {e}")
-                all_prices[symbol] = []
+        except Exception as e:
+            logger.error(f"Erro ao obter preços: {e}")
         
         return all_prices
 
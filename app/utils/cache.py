@@ -0,0 +1,56 @@
+"""
+Cache assíncrono em memória com expiração (TTL) e single-flight
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class AsyncTTLCache:
+    """Cache com TTL que agrupa chamadas concorrentes para a mesma chave
+    
+    Enquanto um valor está sendo carregado, outras chamadas com a mesma chave
+    aguardam o mesmo resultado em vez de disparar uma nova busca (single-flight).
+    """
+    
+    def __init__(self, ttl: float, maxsize: int = 128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+    
+    async def get_or_set(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Obter o valor em cache ou carregá-lo com `factory` uma única vez
+        
+        A carga roda em uma tarefa própria: cancelar um chamador (inclusive o que
+        iniciou a busca) não cancela a carga nem os demais chamadores em espera.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        
+        return await asyncio.shield(task)
+    
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        """Armazenar o resultado da carga concluída e liberar a chave"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        
+        if task.cancelled():
+            return
+        # Marcar a exceção como consumida caso ninguém esteja aguardando
+        if task.exception() is None:
+            self._store(key, task.result())
+    
+    def _store(self, key: Hashable, value: Any):
+        """Armazenar valor, descartando a entrada mais antiga se o cache estiver cheio"""
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.maxsize:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (time.monotonic() + self.ttl, value)